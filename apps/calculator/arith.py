@@ -0,0 +1,52 @@
+import ast
+import operator
+
+# Small, safe arithmetic evaluator used when the model is unavailable.
+# Supports numbers, variables, + - * / // % and ^ / ** with sane bounds.
+
+BINARY = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+UNARY = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+MAX_EXPONENT = 100
+
+def _number(value):
+    if isinstance(value, bool):
+        raise ValueError("Not a number")
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        return float(value) if any(c in value for c in ".eE") else int(value)
+    raise ValueError("Not a number")
+
+def _eval(node, variables: dict):
+    if isinstance(node, ast.Expression):
+        return _eval(node.body, variables)
+    if isinstance(node, ast.Constant):
+        return _number(node.value)
+    if isinstance(node, ast.Name):
+        if node.id not in variables:
+            raise ValueError(f"Unknown variable {node.id}")
+        return _number(variables[node.id])
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY:
+        return UNARY[type(node.op)](_eval(node.operand, variables))
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY:
+        left = _eval(node.left, variables)
+        right = _eval(node.right, variables)
+        if isinstance(node.op, ast.Pow) and abs(right) > MAX_EXPONENT:
+            raise ValueError("Exponent too large")
+        return BINARY[type(node.op)](left, right)
+    raise ValueError(f"Unsupported expression: {type(node).__name__}")
+
+def evaluate(expr: str, variables: dict):
+    expr = expr.replace("^", "**").replace("×", "*").replace("÷", "/")
+    result = _eval(ast.parse(expr, mode="eval"), variables)
+    if isinstance(result, float) and result.is_integer():
+        return int(result)
+    return result
@@ -0,0 +1,162 @@
+import asyncio
+import collections
+import datetime
+import random
+import time
+import weakref
+
+from apps.calculator.prompts import PROMPT_VERSIONS
+from apps.calculator.ratelimit import quota_limiter
+from constants import (
+    CONTEXT_CACHE,
+    CONTEXT_CACHE_TTL,
+    GEMINI_API_KEY,
+    MODEL_HEDGE,
+    MODEL_HEDGE_MIN_DELAY,
+    MODEL_RETRIES,
+    MODEL_RETRY_BACKOFF,
+    MODEL_TIMEOUT,
+)
+from metrics import inc
+
+# google.generativeai pulls in grpc, protobuf and google-api-core, which
+# takes seconds on a cold container; it is imported and configured on first
+# use (or by preload()) rather than when this module loads.
+_genai = None
+_retryable = None
+
+def get_genai():
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+        _genai = genai
+    return _genai
+
+# Failures worth another attempt; anything else (bad request, auth) is final
+def retryable() -> tuple:
+    global _retryable
+    if _retryable is None:
+        from google.api_core import exceptions as google_exceptions
+        _retryable = (
+            asyncio.TimeoutError,
+            google_exceptions.TooManyRequests,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.InternalServerError,
+            google_exceptions.DeadlineExceeded,
+        )
+    return _retryable
+
+# Import the SDK now and report how long it took
+def preload() -> float:
+    start = time.perf_counter()
+    get_genai()
+    retryable()
+    return time.perf_counter() - start
+
+# (model name, prompt version) -> (GenerativeModel, monotonic refresh time)
+_models = {}
+_models_lock = asyncio.Lock()
+
+# The static prompt prefix goes out as the system instruction. With
+# CONTEXT_CACHE it is also registered with the provider's context cache, so
+# it is uploaded once per TTL instead of on every call.
+async def _create_model(model_name: str, system_instruction: str, generation_config):
+    genai = get_genai()
+    if CONTEXT_CACHE:
+        try:
+            from google.generativeai import caching
+            cached = await asyncio.to_thread(
+                caching.CachedContent.create,
+                model=f"models/{model_name}",
+                system_instruction=system_instruction,
+                ttl=datetime.timedelta(seconds=CONTEXT_CACHE_TTL),
+            )
+            inc("context_cache.created")
+            model = genai.GenerativeModel.from_cached_content(cached, generation_config=generation_config)
+            # Refresh a little before the provider expires the handle
+            return model, CONTEXT_CACHE_TTL * 0.9
+        except Exception as e:
+            # e.g. the prompt is under the provider's minimum cacheable size
+            inc("context_cache.unavailable")
+            print(f"Context caching unavailable for {model_name}: {e}")
+    model = genai.GenerativeModel(
+        model_name=model_name, system_instruction=system_instruction, generation_config=generation_config
+    )
+    return model, CONTEXT_CACHE_TTL
+
+async def get_model(model_name: str, version: str, generation_config):
+    key = (model_name, version)
+    entry = _models.get(key)
+    if entry is None or entry[1] <= time.monotonic():
+        async with _models_lock:
+            entry = _models.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                model, ttl = await _create_model(model_name, PROMPT_VERSIONS[version], generation_config)
+                entry = (model, time.monotonic() + ttl)
+                _models[key] = entry
+    return entry[0]
+
+# Recent successful attempt latencies per model object, used to pick the
+# hedging delay; the classifier's short calls do not mix with analyses
+latencies = weakref.WeakKeyDictionary()
+
+def p95_latency(model):
+    samples = latencies.get(model, ())
+    if len(samples) < 20:
+        return None  # not enough samples to hedge sensibly
+    ordered = sorted(samples)
+    return ordered[int(len(ordered) * 0.95) - 1]
+
+async def _attempt(model, contents, **kwargs):
+    start = time.monotonic()
+    response = await asyncio.wait_for(
+        model.generate_content_async(contents, request_options={"timeout": MODEL_TIMEOUT}, **kwargs),
+        MODEL_TIMEOUT,
+    )
+    latencies.setdefault(model, collections.deque(maxlen=200)).append(time.monotonic() - start)
+    return response
+
+# Start a second attempt if the first has not answered by the p95 latency
+# and there is quota for it; the first success wins and the other attempt
+# is cancelled.
+async def _hedged(model, contents, tokens, **kwargs):
+    delay = p95_latency(model)
+    first = asyncio.create_task(_attempt(model, contents, **kwargs))
+    if not MODEL_HEDGE or delay is None:
+        return await first
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=max(delay, MODEL_HEDGE_MIN_DELAY))
+        if not done and quota_limiter.try_acquire(tokens):
+            print(f"Hedging model call after {delay:.2f}s")
+            pending.add(asyncio.create_task(_attempt(model, contents, **kwargs)))
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+# generate_content with a per-attempt deadline, optional hedging and
+# jittered exponential backoff between retries. The caller has taken quota
+# for the first attempt; every extra attempt needs quota of its own
+# (tokens each) and is skipped when the bucket has none.
+async def generate(model, contents, tokens: int, **kwargs):
+    for attempt in range(MODEL_RETRIES + 1):
+        try:
+            return await _hedged(model, contents, tokens, **kwargs)
+        except retryable() as e:
+            if attempt == MODEL_RETRIES:
+                raise
+            delay = random.uniform(0, MODEL_RETRY_BACKOFF * 2 ** attempt)
+            await asyncio.sleep(delay)
+            if not quota_limiter.try_acquire(tokens):
+                print(f"Model call failed ({type(e).__name__}), no quota to retry")
+                raise
+            print(f"Model call failed ({type(e).__name__}), retrying after {delay:.2f}s")
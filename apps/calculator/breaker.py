@@ -0,0 +1,74 @@
+import collections
+import math
+import time
+
+from constants import (
+    BREAKER_COOLDOWN,
+    BREAKER_ERROR_RATE,
+    BREAKER_MIN_CALLS,
+    BREAKER_SLOW_CALL,
+    BREAKER_SLOW_RATE,
+    BREAKER_WINDOW,
+)
+
+# Closed: calls flow and outcomes are recorded. Open: calls are refused until
+# the cooldown ends. Half-open: one probe call is let through; its outcome
+# closes the breaker again or re-opens it.
+class CircuitBreaker:
+    def __init__(self, window: int, min_calls: int, error_rate: float, slow_call: float,
+                 slow_rate: float, cooldown: float):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probe_started = 0.0
+        self.outcomes = collections.deque(maxlen=window)  # (ok, slow)
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == "closed":
+            return True
+        if self.state == "open" and now - self.opened_at < self.cooldown:
+            return False
+        # Half-open: one probe at a time, replaced if it never reports back
+        if self.state == "open" or now - self.probe_started >= self.cooldown:
+            self._set_state("half_open")
+            self.probe_started = now
+            return True
+        return False
+
+    def record(self, ok: bool, latency: float):
+        slow = latency >= self.slow_call
+        if self.state == "half_open":
+            if ok and not slow:
+                self.outcomes.clear()
+                self._set_state("closed")
+            else:
+                self._trip()
+            return
+        self.outcomes.append((ok, slow))
+        if len(self.outcomes) < self.min_calls:
+            return
+        errors = sum(1 for ok, _ in self.outcomes if not ok) / len(self.outcomes)
+        slows = sum(1 for _, slow in self.outcomes if slow) / len(self.outcomes)
+        if errors >= self.error_rate or slows >= self.slow_rate:
+            self._trip()
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.opened_at + self.cooldown - time.monotonic()))
+
+    def _trip(self):
+        self.opened_at = time.monotonic()
+        self._set_state("open")
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            print(f"Model circuit breaker: {self.state} -> {state}")
+            self.state = state
+
+model_breaker = CircuitBreaker(
+    BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_ERROR_RATE, BREAKER_SLOW_CALL, BREAKER_SLOW_RATE, BREAKER_COOLDOWN
+)
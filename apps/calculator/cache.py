@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+from typing import Optional
+
+from cachetools import TTLCache
+
+from apps.calculator.variables import canonical_vars
+from constants import CACHE_SIZE, CACHE_TTL
+
+# (image digest, variables) -> answers
+results = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+# image digest -> last answers for that image, whatever the variables were
+transcriptions = TTLCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+
+def image_digest(image: str) -> str:
+    return hashlib.sha256(image.encode()).hexdigest()
+
+def vars_key(dict_of_vars: dict) -> str:
+    return canonical_vars(dict_of_vars)
+
+def get_result(digest: str, dict_of_vars: dict) -> Optional[list]:
+    return results.get((digest, vars_key(dict_of_vars)))
+
+def put_result(digest: str, dict_of_vars: dict, answers: list):
+    results[(digest, vars_key(dict_of_vars))] = answers
+    transcriptions[digest] = answers
+
+# Persistence across restarts (CACHE_FILE). Entries get a fresh TTL on load.
+def dump() -> dict:
+    return {
+        "results": [[digest, key, answers] for (digest, key), answers in results.items()],
+        "transcriptions": [[digest, answers] for digest, answers in transcriptions.items()],
+    }
+
+def restore(data: dict) -> int:
+    for digest, key, answers in data.get("results", []):
+        results[(digest, key)] = answers
+    for digest, answers in data.get("transcriptions", []):
+        transcriptions[digest] = answers
+    return len(results)
+
+def read_file(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+# Newer entries win and go last; the oldest are dropped beyond CACHE_SIZE
+def _merge_entries(old: list, new: list, width: int) -> list:
+    merged = {tuple(entry[:width]): entry for entry in old}
+    for entry in new:
+        merged.pop(tuple(entry[:width]), None)
+        merged[tuple(entry[:width])] = entry
+    return list(merged.values())[-CACHE_SIZE:]
+
+def _merge(old: dict, new: dict) -> dict:
+    return {
+        "results": _merge_entries(old.get("results", []), new["results"], 2),
+        "transcriptions": _merge_entries(old.get("transcriptions", []), new["transcriptions"], 1),
+    }
+
+# Every worker saves its own cache on shutdown: merge with the file under a
+# lock, and write through a per-process temporary file
+def write_file(path: str, data: dict):
+    with open(f"{path}.lock", "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            old = read_file(path) or {}
+        except ValueError:
+            old = {}  # unreadable; overwrite it
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(_merge(old, data), f, ensure_ascii=False)
+        os.replace(tmp, path)
@@ -0,0 +1,82 @@
+import ipaddress
+import socket
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from constants import CALLBACK_HOSTS
+
+# Job callbacks are POSTed by the server to a client-supplied URL, so only
+# https URLs to allowed hosts are accepted, and never to internal addresses
+# (loopback, private, link-local such as cloud metadata endpoints). The host
+# is resolved once at send time and the connection goes to that vetted
+# address, so a rebinding DNS name cannot switch to an internal one between
+# the check and the request.
+
+def _is_public(address: str) -> bool:
+    address = ipaddress.ip_address(address.split("%")[0])
+    if getattr(address, "ipv4_mapped", None) is not None:
+        address = address.ipv4_mapped
+    return address.is_global
+
+def check_url(url: str) -> str:
+    parts = urlsplit(url)
+    if parts.scheme != "https" or not parts.hostname:
+        raise ValueError("callback_url must be an https URL")
+    if parts.username or parts.password:
+        raise ValueError("callback_url must not contain credentials")
+    host = parts.hostname.lower()
+    if CALLBACK_HOSTS and host not in CALLBACK_HOSTS:
+        raise ValueError("callback_url host is not allowed")
+    try:
+        ipaddress.ip_address(host.split("%")[0])
+    except ValueError:
+        return url  # a host name; its addresses are checked when the callback is sent
+    if not _is_public(host):
+        raise ValueError("callback_url must not point to an internal address")
+    return url
+
+# A public address for the URL's host, or None if it does not resolve or
+# any of its addresses is internal
+def vetted_address(url: str) -> Optional[str]:
+    parts = urlsplit(url)
+    try:
+        infos = socket.getaddrinfo(parts.hostname, parts.port or 443, proto=socket.IPPROTO_TCP)
+    except OSError:
+        return None
+    addresses = [info[4][0] for info in infos]
+    if not addresses or not all(_is_public(address) for address in addresses):
+        return None
+    return addresses[0]
+
+# Connects to the vetted address but verifies TLS (SNI and certificate)
+# against the original host name
+class PinnedAdapter(HTTPAdapter):
+    def __init__(self, hostname: str, **kwargs):
+        self.hostname = hostname
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["server_hostname"] = self.hostname
+        kwargs["assert_hostname"] = self.hostname
+        super().init_poolmanager(*args, **kwargs)
+
+def post(url: str, payload: dict, timeout: float) -> requests.Response:
+    address = vetted_address(url)
+    if address is None:
+        raise ValueError("callback host resolves to an internal address")
+    parts = urlsplit(url)
+    host = f"[{address}]" if ":" in address else address
+    port = f":{parts.port}" if parts.port else ""
+    pinned = urlunsplit(parts._replace(netloc=f"{host}{port}"))
+    with requests.Session() as session:
+        session.mount(f"https://{host}{port}", PinnedAdapter(parts.hostname))
+        return session.post(
+            pinned,
+            json=payload,
+            timeout=timeout,
+            allow_redirects=False,
+            headers={"Host": f"{parts.hostname}{port}"},
+        )
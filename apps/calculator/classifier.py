@@ -0,0 +1,91 @@
+import colorsys
+from typing import Optional
+
+from PIL import Image
+
+from apps.calculator.backend import generate, get_genai
+from apps.calculator.limiter import Overloaded
+from apps.calculator.prompts import CASE_GROUPS
+from apps.calculator.ratelimit import quota_limiter
+from apps.calculator.utils import ink_bbox
+from constants import CLASSIFIER, CLASSIFIER_MODEL
+from metrics import inc
+
+# Cheap pre-classification of a canvas so the main call can use a short,
+# case-specific prompt. Returns a CASE_GROUPS name, or None for the full prompt.
+
+MODEL_CASES = ["expression", "equations", "assignment", "graphical", "abstract"]
+CLASSIFIER_PROMPT = (
+    "Classify the handwritten content of this image. Answer with one word: "
+    "expression (an arithmetic expression to evaluate), equations (equations to solve), "
+    "assignment (variables being assigned values), graphical (a drawn word problem or diagram), "
+    "abstract (a drawing of an idea, feeling or historic reference)."
+)
+CLASSIFIER_CONFIG = {
+    "response_mime_type": "text/x.enum",
+    "response_schema": {"type": "string", "enum": MODEL_CASES},
+    "max_output_tokens": 5,
+}
+# Quota estimate for one classification: prompt, image and a one-word answer
+CLASSIFIER_TOKENS = len(CLASSIFIER_PROMPT) // 4 + 300
+_classifier_model = None
+
+# The local heuristics only narrow the prompt on a strong signal and keep
+# the full prompt otherwise: coloured ink says little (a 2 + 2 is often
+# written in colour), so it never selects the drawing cases, and only a long
+# single-colour line of ink reads as written math.
+# Largest fraction of sampled ink pixels that may be saturated colour
+MONO_SHARE = 0.02
+# Ink at least this much wider than tall reads as a line of written math
+LINE_ASPECT = 4
+
+def classify_locally(img: Image) -> Optional[str]:
+    bbox = ink_bbox(img)
+    if bbox is None:
+        return None
+    left, top, right, bottom = bbox
+    if (right - left) < LINE_ASPECT * (bottom - top):
+        return None
+    sample = img.convert("RGBA").crop(bbox)
+    sample.thumbnail((64, 64))
+    background = img.convert("RGBA").getpixel((0, 0))
+    ink = coloured = 0
+    for r, g, b, a in sample.getdata():
+        if a < 128 or max(abs(r - background[0]), abs(g - background[1]), abs(b - background[2])) < 48:
+            continue
+        ink += 1
+        _, _, saturation = colorsys.rgb_to_hls(r / 255, g / 255, b / 255)
+        if saturation > 0.5 and max(r, g, b) > 64:
+            coloured += 1
+    if ink and coloured / ink <= MONO_SHARE:
+        return "math"
+    return None
+
+async def classify_with_model(img: Image, upload: dict) -> Optional[str]:
+    global _classifier_model
+    try:
+        await quota_limiter.acquire(CLASSIFIER_TOKENS)
+        if _classifier_model is None:
+            _classifier_model = get_genai().GenerativeModel(
+                model_name=CLASSIFIER_MODEL, system_instruction=CLASSIFIER_PROMPT, generation_config=CLASSIFIER_CONFIG
+            )
+        response = await generate(_classifier_model, [upload], CLASSIFIER_TOKENS)
+        label = response.text.strip().lower()
+        return label if label in CASE_GROUPS else None
+    except Overloaded:
+        return classify_locally(img)
+    except Exception as e:
+        print(f"Pre-classification failed: {e}")
+        return classify_locally(img)
+
+# Prompt version for this canvas, or None to use the default prompt;
+# upload is the encoded canvas as sent to the model
+async def choose_prompt(img: Image, upload: dict) -> Optional[str]:
+    if CLASSIFIER == "off":
+        return None
+    if CLASSIFIER == "model":
+        case = await classify_with_model(img, upload)
+    else:
+        case = classify_locally(img)
+    inc(f"classify.{case or 'full'}")
+    return f"case:{case}" if case else None
@@ -0,0 +1,40 @@
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from constants import ENCODE_BUDGET
+
+# Pick the smallest encoding of the canvas the model accepts, instead of
+# letting the SDK re-encode the PIL image with default settings. Candidates
+# are tried cheapest first until the CPU budget (seconds) is spent.
+
+def _save(img: Image, format: str, **params) -> bytes:
+    buffer = BytesIO()
+    img.save(buffer, format=format, **params)
+    return buffer.getvalue()
+
+def _candidates(img: Image):
+    yield "png", "image/png", lambda: _save(img, "PNG", optimize=True)
+    # A few colours at most (binarised or drawn ink): an exact palette is lossless
+    if img.mode not in ("1", "P") and img.getcolors(256) is not None:
+        yield "png-palette", "image/png", lambda: _save(img.convert("P", palette=Image.Palette.ADAPTIVE), "PNG", optimize=True)
+    yield "webp", "image/webp", lambda: _save(img, "WEBP", lossless=True, method=4)
+    # Photo-like content with many colours compresses far better lossy
+    if img.mode in ("RGB", "RGBA") and img.getcolors(4096) is None:
+        yield "jpeg", "image/jpeg", lambda: _save(img.convert("RGB"), "JPEG", quality=90, optimize=True)
+
+# (format, mime type, data, size of the optimised PNG baseline)
+def encode_smallest(img: Image, budget: float = ENCODE_BUDGET) -> tuple:
+    start = time.monotonic()
+    baseline = None
+    best = None
+    for name, mime_type, encode in _candidates(img):
+        data = encode()
+        if baseline is None:
+            baseline = len(data)
+        if best is None or len(data) < len(best[2]):
+            best = (name, mime_type, data)
+        if time.monotonic() - start > budget:
+            break
+    return best + (baseline,)
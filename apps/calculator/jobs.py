@@ -0,0 +1,138 @@
+import asyncio
+import itertools
+import time
+import uuid
+from typing import Optional
+
+from apps.calculator import callbacks
+from apps.calculator.service import solve
+from constants import JOB_QUEUE_SIZE, JOB_TTL, JOB_WORKERS
+from schema import Answer, ImageData
+
+class QueueFull(Exception):
+    pass
+
+class Job:
+    def __init__(self, data: ImageData, priority: int, callback_url: Optional[str]):
+        self.id = uuid.uuid4().hex
+        self.data = data
+        self.priority = priority
+        self.callback_url = callback_url
+        self.status = "queued"  # queued -> running -> done | failed | cancelled
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "priority": self.priority,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class JobQueue:
+    def __init__(self, workers: int, maxsize: int, ttl: int):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.jobs = {}
+        self._queue = None
+        self._seq = itertools.count()
+        self._tasks = []
+        self.closed = False
+
+    async def start(self):
+        self._queue = asyncio.PriorityQueue(self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    # Stop accepting jobs; queued jobs are cancelled as workers reach them
+    def close(self):
+        self.closed = True
+
+    async def stop(self):
+        self.close()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, data: ImageData, priority: int = 0, callback_url: Optional[str] = None) -> Job:
+        if self.closed:
+            raise QueueFull()
+        self._prune()
+        job = Job(data, priority, callback_url)
+        try:
+            # Higher priority first, FIFO within the same priority
+            self._queue.put_nowait((-priority, next(self._seq), job))
+        except asyncio.QueueFull:
+            raise QueueFull()
+        self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.status not in ("queued", "running"):
+            return False
+        if job.task is not None:
+            job.task.cancel()
+        # Queued jobs are skipped by the worker when dequeued
+        job.status = "cancelled"
+        job.finished_at = time.time()
+        return True
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                if job.status == "cancelled":
+                    continue
+                if self.closed:
+                    job.status = "cancelled"
+                    job.error = "Server shutting down"
+                    job.finished_at = time.time()
+                    continue
+                job.status = "running"
+                job.started_at = time.time()
+                job.task = asyncio.create_task(solve(job.data))
+                try:
+                    # Public answer fields only: results go out as-is in job status and callbacks
+                    job.result = [Answer.model_validate(answer).model_dump() for answer in await job.task]
+                    job.status = "done"
+                except asyncio.CancelledError:
+                    if job.status != "cancelled":
+                        raise  # the worker itself is being stopped
+                except Exception as e:
+                    print(f"Job {job.id} failed: {e}")
+                    job.error = str(e)
+                    job.status = "failed"
+                job.finished_at = job.finished_at or time.time()
+                job.task = None
+                if job.callback_url:
+                    await self._notify(job)
+            finally:
+                self._queue.task_done()
+
+    async def _notify(self, job: Job):
+        try:
+            await asyncio.to_thread(callbacks.post, job.callback_url, job.to_dict(), 10)
+        except Exception as e:
+            print(f"Callback for job {job.id} failed: {e}")
+
+job_queue = JobQueue(JOB_WORKERS, JOB_QUEUE_SIZE, JOB_TTL)
@@ -0,0 +1,107 @@
+import asyncio
+import collections
+import time
+from contextlib import asynccontextmanager
+
+from constants import (
+    LIMIT_INITIAL,
+    LIMIT_LATENCY_TARGET,
+    LIMIT_MAX,
+    LIMIT_MIN,
+    LIMIT_QUEUE_SIZE,
+    LIMIT_QUEUE_TIMEOUT,
+)
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: int, message: str = "Server overloaded"):
+        super().__init__(f"{message}, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+# AIMD concurrency limiter: the limit grows by one per "window" of fast calls
+# and is halved when a call is slower than the latency target or fails, at
+# most once per window: calls that started before the last decrease saw the
+# old limit and do not halve it again. Requests over the limit wait in a
+# bounded queue for at most queue_timeout.
+class AdaptiveLimiter:
+    def __init__(self, initial: int, min_limit: int, max_limit: int, latency_target: float,
+                 queue_size: int, queue_timeout: float):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.inflight = 0
+        self.avg_latency = latency_target / 2
+        self._started = 0  # calls started so far
+        self._decreased_at = 0  # value of _started at the last decrease
+        self._waiters = collections.deque()
+
+    def retry_after(self) -> int:
+        backlog = len(self._waiters) + 1
+        return max(1, int(backlog * self.avg_latency / max(self.limit, 1)))
+
+    async def acquire(self):
+        if self.inflight < int(self.limit) and not self._waiters:
+            self.inflight += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            raise Overloaded(self.retry_after())
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted a slot just as we gave up on it; hand it on
+                self.inflight -= 1
+                self._wake()
+            if isinstance(e, asyncio.TimeoutError):
+                raise Overloaded(self.retry_after())
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    # started is the call's sequence number from slot()
+    def release(self, latency: float, ok: bool, started: int):
+        self.inflight -= 1
+        self.avg_latency = 0.9 * self.avg_latency + 0.1 * latency
+        if ok and latency <= self.latency_target:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        elif started > self._decreased_at:
+            self.limit = max(self.min_limit, self.limit / 2)
+            self._decreased_at = self._started
+        self._wake()
+
+    # A cancelled call (client gone) says nothing about backend latency
+    def abandon(self):
+        self.inflight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.inflight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.inflight += 1
+                waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        self._started += 1
+        started = self._started
+        start = time.monotonic()
+        try:
+            yield
+        except asyncio.CancelledError:
+            self.abandon()
+            raise
+        except BaseException:
+            self.release(time.monotonic() - start, False, started)
+            raise
+        self.release(time.monotonic() - start, True, started)
+
+model_limiter = AdaptiveLimiter(
+    LIMIT_INITIAL, LIMIT_MIN, LIMIT_MAX, LIMIT_LATENCY_TARGET, LIMIT_QUEUE_SIZE, LIMIT_QUEUE_TIMEOUT
+)
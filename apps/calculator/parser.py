@@ -0,0 +1,148 @@
+import ast
+import json
+import re
+from typing import Iterator, List
+
+# Tolerant, incremental parser for the model's answer format: a list of
+# dicts written as JSON or as Python literals, possibly wrapped in markdown
+# fences or prose. Every complete top-level {...} object is decoded on its
+# own, so one broken entry does not lose the others and streaming chunks can
+# be fed as they arrive. An unbalanced quote (it's inside '...') throws the
+# string tracking off, so text that does not decode is re-scanned brace by
+# brace to recover the entries after it.
+
+PYTHON_LITERALS = re.compile(r"\b(true|false|null)\b")
+LITERAL_MAP = {"true": "True", "false": "False", "null": "None"}
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+# Closing braces tried per opening brace when recovering broken text, and
+# decode attempts per recovery, so pathological input stays cheap
+RECOVERY_SPAN = 8
+RECOVERY_ATTEMPTS = 128
+
+# Deeply nested input overflows the decoders' recursion instead of failing
+DECODE_ERRORS = (ValueError, SyntaxError, TypeError, RecursionError, MemoryError)
+
+def _decode(text: str):
+    try:
+        return json.loads(text)
+    except DECODE_ERRORS:
+        pass
+    try:
+        return ast.literal_eval(text)
+    except DECODE_ERRORS:
+        pass
+    # Mixed JSON/Python spellings and trailing commas. The rewrite can touch
+    # string contents too, so it is only tried after both strict decoders
+    relaxed = TRAILING_COMMA.sub(r"\1", PYTHON_LITERALS.sub(lambda m: LITERAL_MAP[m.group(1)], text))
+    try:
+        return ast.literal_eval(relaxed)
+    except DECODE_ERRORS:
+        return None
+
+# Decode every {...} in text that parses as a dict, ignoring string state;
+# returns the answers and the number of broken stretches skipped
+def _recover(text: str) -> tuple:
+    starts = [i for i, char in enumerate(text) if char == "{"]
+    ends = [i for i, char in enumerate(text) if char == "}"]
+    answers = []
+    broken = 0
+    skipped = False
+    position = 0
+    attempts = 0
+    for start in starts:
+        if start < position:
+            continue
+        found = None
+        for end in [end for end in ends if end > start][:RECOVERY_SPAN]:
+            attempts += 1
+            if attempts > RECOVERY_ATTEMPTS:
+                return answers, broken + 1
+            answer = _decode(text[start:end + 1])
+            if isinstance(answer, dict):
+                found = (answer, end)
+                break
+        if found is None:
+            skipped = True
+            continue
+        if skipped:
+            broken += 1
+            skipped = False
+        answers.append(found[0])
+        position = found[1] + 1
+    return answers, broken + skipped
+
+class AnswerParser:
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._quote = None
+        self._escaped = False
+        self.errors = 0
+
+    def feed(self, chunk: str) -> Iterator[dict]:
+        for char in chunk:
+            if self._depth:
+                self._buffer.append(char)
+            if self._quote:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == self._quote:
+                    self._quote = None
+                continue
+            if char == "{":
+                if not self._depth:
+                    self._buffer = [char]
+                self._depth += 1
+            elif char == "}" and self._depth:
+                self._depth -= 1
+                if not self._depth:
+                    answer = _decode("".join(self._buffer))
+                    if isinstance(answer, dict):
+                        yield answer
+                    else:
+                        yield from self._recover()
+            elif char in "'\"" and self._depth:
+                self._quote = char
+
+    def _recover(self) -> Iterator[dict]:
+        answers, broken = _recover("".join(self._buffer))
+        self.errors += broken
+        self._buffer = []
+        self._depth = 0
+        self._quote = None
+        self._escaped = False
+        yield from answers
+
+    # Returns the entries recovered from an object still open at the end of
+    # the stream (truncated output, or a quote that never closed)
+    def close(self) -> List[dict]:
+        return list(self._recover()) if self._depth else []
+
+def parse_answers(text: str) -> List[dict]:
+    # Fast path: the whole response is a well-formed list
+    stripped = text.strip()
+    if stripped.startswith("["):
+        answers = _decode(stripped)
+        if isinstance(answers, list) and all(isinstance(a, dict) for a in answers):
+            return answers
+    parser = AnswerParser()
+    answers = list(parser.feed(text))
+    answers.extend(parser.close())
+    return answers
+
+# Benchmark: python -m apps.calculator.parser
+if __name__ == "__main__":
+    import timeit
+    entry = "{'expr': '2 + 2', 'result': 4, 'assign': False}"
+    cases = {
+        "well-formed": "[" + ", ".join([entry] * 5) + "]",
+        "prose and fences": "Here you go:\n```python\n[" + ", ".join([entry] * 5) + "]\n```",
+        "broken entry": "[" + ", ".join([entry] * 2 + ["{'expr': 'x', 'result': }"] + [entry] * 2) + "]",
+        "unbalanced quote": " ".join(["{'expr': 'it's', 'result': 1}"] + [entry] * 4),
+        "truncated": "[" + ", ".join([entry] * 4) + ", {'expr': '2 +",
+    }
+    for name, text in cases.items():
+        runs, seconds = timeit.Timer(lambda: parse_answers(text)).autorange()
+        print(f"{name}: {len(parse_answers(text))} answers, {seconds / runs * 1e6:.1f} us")
@@ -0,0 +1,104 @@
+import asyncio
+import base64
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from multiprocessing.shared_memory import SharedMemory
+
+from PIL import Image
+
+from apps.calculator.encode import encode_smallest
+from apps.calculator.preprocess import binarise
+from apps.calculator.utils import ink_bbox, is_blank
+from constants import CROP_MARGIN, MAX_SIDE, POOL_MIN_BYTES, PREPROCESS, PREPROCESS_WORKERS
+from metrics import inc
+
+# Canvas preprocessing: decode, blank check, crop to the ink, scale, binarise
+# and encode. Large canvases go to a process pool so the work scales with
+# cores instead of serialising on the GIL; the base64 payload reaches the
+# worker through shared memory rather than as pickled bytes.
+
+def prepare_canvas(payload) -> dict:
+    img = Image.open(BytesIO(base64.b64decode(payload)))
+    img.load()
+    if is_blank(img):
+        return {"blank": True}
+    left, top, right, bottom = ink_bbox(img)
+    img = img.crop((
+        max(0, left - CROP_MARGIN),
+        max(0, top - CROP_MARGIN),
+        min(img.width, right + CROP_MARGIN),
+        min(img.height, bottom + CROP_MARGIN),
+    ))
+    if max(img.size) > MAX_SIDE:
+        img.thumbnail((MAX_SIDE, MAX_SIDE))
+    if PREPROCESS == "binarise":
+        img = binarise(img)
+    format, mime_type, data, baseline = encode_smallest(img)
+    return {
+        "blank": False, "mode": img.mode, "format": format, "mime_type": mime_type, "data": data, "baseline": baseline,
+    }
+
+def _prepare_shared(name: str, size: int) -> dict:
+    shm = SharedMemory(name=name)
+    try:
+        payload = shm.buf[:size]
+        try:
+            return prepare_canvas(payload)
+        finally:
+            payload.release()
+    finally:
+        shm.close()
+
+_pool = None
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Never fork the running server (event loop, gRPC threads)
+        _pool = ProcessPoolExecutor(PREPROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+# A worker that died (OOM kill, crash) breaks the whole pool for good: drop
+# it so the next large canvas starts a fresh one
+def _discard_pool(pool: ProcessPoolExecutor):
+    global _pool
+    if _pool is pool:
+        _pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+# image_data is the request's data URL; returns the prepare_canvas() result
+async def prepare(image_data: str) -> dict:
+    payload = image_data.split(",")[1].encode("ascii")
+    if PREPROCESS_WORKERS == 0 or len(payload) < POOL_MIN_BYTES:
+        prepared = await asyncio.to_thread(prepare_canvas, payload)
+    else:
+        shm = SharedMemory(create=True, size=len(payload))
+        pool = _get_pool()
+        try:
+            shm.buf[:len(payload)] = payload
+            inc("preprocess.pool")
+            prepared = await asyncio.get_running_loop().run_in_executor(
+                pool, _prepare_shared, shm.name, len(payload)
+            )
+        except BrokenProcessPool:
+            print("Preprocessing pool broken, restarting it; this canvas runs in a thread")
+            inc("preprocess.pool_broken")
+            _discard_pool(pool)
+            prepared = await asyncio.to_thread(prepare_canvas, payload)
+        finally:
+            shm.close()
+            shm.unlink()
+    if not prepared["blank"]:
+        inc(f"preprocess.mode.{prepared['mode']}")
+        inc(f"encode.format.{prepared['format']}")
+        inc("encode.bytes_sent", len(prepared["data"]))
+        inc("encode.bytes_saved", prepared["baseline"] - len(prepared["data"]))
+    return prepared
@@ -0,0 +1,51 @@
+import numpy as np
+from PIL import Image
+
+from constants import INK_PALETTE_COLOURS
+
+# Reduce the canvas to its ink before upload: a 1-bit black-on-white image,
+# or a small palette image when coloured ink matters (graphical problems).
+
+# Minimum contrast with the background for a pixel to count as ink
+MIN_INK = 16
+# Share of ink that must be saturated colour to keep colours
+COLOUR_SHARE = 0.1
+
+# Otsu's threshold over 8-bit values, maximising between-class variance
+def otsu_threshold(values: np.ndarray) -> int:
+    histogram = np.bincount(values.ravel(), minlength=256).astype(np.float64)
+    total = histogram.sum()
+    weight = np.cumsum(histogram)
+    mass = np.cumsum(histogram * np.arange(256))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variance = (mass[-1] * weight / total - mass) ** 2 / (weight * (total - weight))
+    return int(np.argmax(np.nan_to_num(variance)))
+
+# Channel-wise max/min; much faster than .max(axis=2) over a length-3 axis
+def _channel_max(rgb: np.ndarray) -> np.ndarray:
+    return np.maximum(np.maximum(rgb[..., 0], rgb[..., 1]), rgb[..., 2])
+
+def _channel_min(rgb: np.ndarray) -> np.ndarray:
+    return np.minimum(np.minimum(rgb[..., 0], rgb[..., 1]), rgb[..., 2])
+
+# Per-pixel ink strength: alpha on a transparent canvas, otherwise the
+# largest channel difference from the background (top-left pixel)
+def ink_strength(rgb: np.ndarray, alpha: np.ndarray) -> np.ndarray:
+    if alpha.min() < 255:
+        return alpha.astype(np.uint8)
+    return _channel_max(np.abs(rgb - rgb[0, 0])).astype(np.uint8)
+
+def binarise(img: Image) -> Image:
+    rgba = np.asarray(img.convert("RGBA"), dtype=np.int16)
+    rgb, alpha = rgba[..., :3], rgba[..., 3]
+    strength = ink_strength(rgb, alpha)
+    ink = strength > max(otsu_threshold(strength), MIN_INK)
+    brightest = _channel_max(rgb)
+    saturated = ink & (brightest - _channel_min(rgb) > 96) & (brightest > 64)
+    if saturated.sum() < COLOUR_SHARE * max(ink.sum(), 1):
+        return Image.fromarray(~ink)  # mode "1", black ink on white
+    # Keep saturated strokes in colour; neutral ink (white or grey chalk) goes black
+    out = np.full(rgb.shape, 255, dtype=np.uint8)
+    out[ink] = 0
+    out[saturated] = rgb[saturated]
+    return Image.fromarray(out, "RGB").quantize(colors=INK_PALETTE_COLOURS, dither=Image.Dither.NONE)
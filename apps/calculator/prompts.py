@@ -0,0 +1,126 @@
+import random
+import sys
+
+from constants import PROMPT_AB_SHARE, PROMPT_AB_VERSION, PROMPT_VERSION
+
+# Prompt text is assembled once at import. Each version is a static block
+# sent as the system instruction; only the variables line is built per
+# request.
+
+INTRO = (
+    "You have been given an image with some mathematical expressions, equations, or graphical problems, and you need to solve them. "
+)
+
+PEMDAS = (
+    "Note: Use the PEMDAS rule for solving mathematical expressions. PEMDAS stands for the Priority Order: Parentheses, Exponents, Multiplication and Division (from left to right), Addition and Subtraction (from left to right). Parentheses have the highest priority, followed by Exponents, then Multiplication and Division, and lastly Addition and Subtraction. "
+    "For example: "
+    "Q. 2 + 3 * 4 "
+    "(3 * 4) => 12, 2 + 12 = 14. "
+    "Q. 2 + 3 + 5 * 4 - 8 / 2 "
+    "5 * 4 => 20, 8 / 2 => 4, 2 + 3 => 5, 5 + 20 => 25, 25 - 4 => 21. "
+)
+
+CASES_HEADER = (
+    "YOU CAN HAVE FIVE TYPES OF EQUATIONS/EXPRESSIONS IN THIS IMAGE, AND ONLY ONE CASE SHALL APPLY EVERY TIME: "
+    "Following are the cases: "
+)
+
+CASES = {
+    1: (
+        "1. Simple mathematical expressions like 2 + 2, 3 * 4, 5 / 6, 7 - 8, etc.: In this case, solve and return the answer in the format of a LIST OF ONE DICT [{'expr': given expression, 'result': calculated answer}]. "
+    ),
+    2: (
+        "2. Set of Equations like x^2 + 2x + 1 = 0, 3y + 4x = 0, 5x^2 + 6y + 7 = 12, etc.: In this case, solve for the given variable, and the format should be a COMMA SEPARATED LIST OF DICTS, with dict 1 as {'expr': 'x', 'result': 2, 'assign': True} and dict 2 as {'expr': 'y', 'result': 5, 'assign': True}. This example assumes x was calculated as 2, and y as 5. Include as many dicts as there are variables. "
+    ),
+    3: (
+        "3. Assigning values to variables like x = 4, y = 5, z = 6, etc.: In this case, assign values to variables and return another key in the dict called {'assign': True}, keeping the variable as 'expr' and the value as 'result' in the original dictionary. RETURN AS A LIST OF DICTS. "
+    ),
+    4: (
+        "4. Analyzing Graphical Math problems, which are word problems represented in drawing form, such as cars colliding, trigonometric problems, problems on the Pythagorean theorem, adding runs from a cricket wagon wheel, etc. These will have a drawing representing some scenario and accompanying information with the image. PAY CLOSE ATTENTION TO DIFFERENT COLORS FOR THESE PROBLEMS. You need to return the answer in the format of a LIST OF ONE DICT [{'expr': given expression, 'result': calculated answer}]. "
+    ),
+    5: (
+        "5. Detecting Abstract Concepts that a drawing might show, such as love, hate, jealousy, patriotism, or a historic reference to war, invention, discovery, quote, etc. USE THE SAME FORMAT AS OTHERS TO RETURN THE ANSWER, where 'expr' will be the explanation of the drawing, and 'result' will be the abstract concept. "
+    ),
+}
+
+ANALYZE = (
+    "Analyze the equation or expression in this image and return the answer according to the given rules: "
+)
+
+ANSWER_FORMAT = (
+    "Return the answers as a JSON list of objects with the keys 'expr', 'result', 'drawn' and, for assignments, 'assign'. "
+    "'drawn' is the expression or equation exactly as written on the canvas, before substituting any variable values. "
+)
+
+VARIABLES = (
+    "Here is a dictionary of user-assigned variables. If the given expression has any of these variables, use its actual value from this dictionary accordingly: {}."
+)
+
+SHORT_CASES = (
+    "Solve the math in this image, using PEMDAS order of operations. Exactly one of these cases applies: "
+    "1. An expression such as 2 + 3 * 4: one object with the expression as 'expr' and the answer as 'result'. "
+    "2. A system of equations: one object per variable, with the variable as 'expr', its value as 'result' and 'assign': true. "
+    "3. Assignments such as x = 4: one object per variable, with the variable as 'expr', the value as 'result' and 'assign': true. "
+    "4. A drawn word problem (collisions, trigonometry, Pythagoras, a cricket wagon wheel...), where colours matter: one object with the problem as 'expr' and the answer as 'result'. "
+    "5. A drawing of an abstract concept (love, war, an invention, a quote...): one object with the explanation as 'expr' and the concept as 'result'. "
+)
+
+PROMPT_VERSIONS = {
+    "v1": INTRO + PEMDAS + CASES_HEADER + "".join(CASES.values()) + ANALYZE + ANSWER_FORMAT,
+    "v2": SHORT_CASES + ANSWER_FORMAT,
+}
+
+# Case-specific prompts for a pre-classified canvas: only the instructions
+# for the detected case(s), which cuts prompt tokens and generation time
+CASE_GROUPS = {
+    "expression": [1],
+    "equations": [2],
+    "assignment": [3],
+    "graphical": [4],
+    "abstract": [5],
+    "math": [1, 2, 3],
+    "drawing": [4, 5],
+}
+
+def _case_prompt(cases: list) -> str:
+    prompt = INTRO
+    if any(case in (1, 2, 4) for case in cases):
+        prompt += PEMDAS
+    if len(cases) > 1:
+        prompt += "EXACTLY ONE OF THE FOLLOWING CASES APPLIES: "
+    return prompt + "".join(CASES[case] for case in cases) + ANALYZE + ANSWER_FORMAT
+
+PROMPT_VERSIONS.update({f"case:{name}": _case_prompt(cases) for name, cases in CASE_GROUPS.items()})
+
+# A misspelt version would otherwise fail every request (and the warm-up)
+for _setting, _version in (("PROMPT_VERSION", PROMPT_VERSION), ("PROMPT_AB_VERSION", PROMPT_AB_VERSION)):
+    if _version and _version not in PROMPT_VERSIONS:
+        raise ValueError(f"{_setting}={_version!r} is not a known prompt version: {', '.join(PROMPT_VERSIONS)}")
+
+# Default version, with an optional share of traffic sent to a second one
+def choose_version() -> str:
+    if PROMPT_AB_VERSION and random.random() < PROMPT_AB_SHARE:
+        return PROMPT_AB_VERSION
+    return PROMPT_VERSION
+
+def variables_prompt(dict_of_vars_str: str) -> str:
+    return VARIABLES.format(dict_of_vars_str)
+
+# Prompt size per version: characters, a chars/4 token estimate and, when a
+# model is given, the provider's exact count
+def token_report(model=None) -> dict:
+    report = {}
+    for version, prefix in PROMPT_VERSIONS.items():
+        report[version] = {"chars": len(prefix), "approx_tokens": len(prefix) // 4}
+        if model is not None:
+            report[version]["tokens"] = model.count_tokens(prefix).total_tokens
+    return report
+
+# python -m apps.calculator.prompts [--exact]
+if __name__ == "__main__":
+    model = None
+    if "--exact" in sys.argv:
+        from apps.calculator.backend import get_genai
+        model = get_genai().GenerativeModel(model_name="gemini-1.5-flash")
+    for version, counts in token_report(model).items():
+        print(version, counts)
@@ -0,0 +1,93 @@
+import asyncio
+import math
+import time
+
+from apps.calculator.limiter import Overloaded
+from apps.calculator.variables import canonical_vars
+from constants import (
+    GEMINI_RPM,
+    GEMINI_TPM,
+    RATE_MAX_WAIT,
+    RATE_TOKENS_PER_REQUEST,
+    WEB_CONCURRENCY,
+)
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        if self.rate <= 0:
+            return 0.0  # unlimited
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    # The balance may go negative: later callers then wait for earlier reservations
+    def take(self, amount: float):
+        if self.rate > 0:
+            self.tokens -= min(amount, self.capacity)
+
+    def give(self, amount: float):
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+
+# Client-side view of the provider quota: one bucket for requests and one for
+# tokens. Capacity is reserved on arrival, so the projected wait includes
+# everyone queued ahead; callers wait up to max_wait for it (in arrival
+# order) and are shed with a 503 if the wait would be longer.
+class QuotaLimiter:
+    def __init__(self, rpm: float, tpm: float, max_wait: float):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_wait = max_wait
+
+    def _wait_time(self, tokens: int) -> float:
+        self.requests.refill()
+        self.tokens.refill()
+        return max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def _take(self, tokens: int):
+        self.requests.take(1)
+        self.tokens.take(tokens)
+
+    def _give(self, tokens: int):
+        self.requests.give(1)
+        self.tokens.give(tokens)
+
+    # Return a reservation that was never used (the call did not go out)
+    def release(self, tokens: int):
+        self._give(tokens)
+
+    # Reserve only if capacity is available right now (retries, hedges)
+    def try_acquire(self, tokens: int) -> bool:
+        if self._wait_time(tokens) > 0:
+            return False
+        self._take(tokens)
+        return True
+
+    async def acquire(self, tokens: int):
+        wait = self._wait_time(tokens)
+        if wait > self.max_wait:
+            raise Overloaded(math.ceil(wait))
+        self._take(tokens)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self._give(tokens)  # the caller gave up; release its reservation
+                raise
+
+# Rough token cost of one analysis: fixed prompt, image and answer, plus the variables
+def estimate_tokens(dict_of_vars: dict) -> int:
+    return RATE_TOKENS_PER_REQUEST + len(canonical_vars(dict_of_vars)) // 4
+
+# Each worker process gets an equal share of the provider quota
+quota_limiter = QuotaLimiter(GEMINI_RPM / WEB_CONCURRENCY, GEMINI_TPM / WEB_CONCURRENCY, RATE_MAX_WAIT)
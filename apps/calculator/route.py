@@ -1,20 +1,91 @@
-from fastapi import APIRouter
-import base64
-from io import BytesIO
-from apps.calculator.utils import analyze_image
-from schema import ImageData
-from PIL import Image
+import asyncio
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+import orjson
+from apps.calculator.jobs import QueueFull, job_queue
+from apps.calculator.service import solve, solve_batch, solve_batch_stream
+from apps.calculator.sessions import clear, get_vars
+from constants import DISCONNECT_POLL
+from metrics import inc
+from schema import BatchImageData, BatchItem, BatchResponse, CalculateResponse, ImageData, JobRequest
 
 router = APIRouter()
 
-@router.post('')
-async def run(data: ImageData):
-    image_data = base64.b64decode(data.image.split(",")[1])  
-    image_bytes = BytesIO(image_data)
-    image = Image.open(image_bytes)
-    responses = analyze_image(image, dict_of_vars=data.dict_of_vars)
+async def until_disconnected(request: Request):
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL)
+
+@router.post('', response_model=CalculateResponse)
+async def run(data: ImageData, request: Request):
+    # Stop the analysis (and its model call) if the client goes away
+    solving = asyncio.create_task(solve(data))
+    watching = asyncio.create_task(until_disconnected(request))
+    try:
+        await asyncio.wait({solving, watching}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        solving.cancel()
+        raise
+    finally:
+        watching.cancel()
+    if not solving.done():
+        solving.cancel()
+        inc("client.disconnected")
+        return Response(status_code=499)  # nobody is left to read it
+    responses = solving.result()
     data = []
     for response in responses:
         data.append(response)
         print('response in route: ',response)
-    return {"message": "Image processed", "data": data, "status": "success"}
\ No newline at end of file
+    return {"message": "Image processed", "data": data, "status": "success"}
+
+@router.post('/batch', response_model=BatchResponse)
+async def run_batch(data: BatchImageData):
+    if data.stream:
+        async def lines():
+            async for result in solve_batch_stream(data.items):
+                # Same shape as the non-streamed items (internal fields such as 'drawn' dropped)
+                yield orjson.dumps(BatchItem.model_validate(result).model_dump()) + b"\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    results = await solve_batch(data.items)
+    return {"message": "Batch processed", "data": results, "status": "success"}
+
+@router.post('/jobs', status_code=202)
+async def create_job(data: JobRequest):
+    try:
+        job = job_queue.submit(
+            ImageData(image=data.image, dict_of_vars=data.dict_of_vars, session_id=data.session_id),
+            priority=data.priority,
+            callback_url=data.callback_url,
+        )
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Job queue is full", headers={"Retry-After": "5"})
+    return {"message": "Job queued", "data": job.to_dict(), "status": "success"}
+
+@router.get('/jobs/{job_id}')
+async def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"message": "Job status", "data": job.to_dict(), "status": "success"}
+
+@router.delete('/jobs/{job_id}')
+async def cancel_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job_queue.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job is already {job.status}")
+    return {"message": "Job cancelled", "data": job.to_dict(), "status": "success"}
+
+@router.get('/sessions/{session_id}')
+async def get_session(session_id: str):
+    variables = get_vars(session_id)
+    if variables is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"message": "Session variables", "data": variables, "status": "success"}
+
+@router.delete('/sessions/{session_id}')
+async def clear_session(session_id: str):
+    if not clear(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"message": "Session cleared", "data": {}, "status": "success"}
@@ -0,0 +1,189 @@
+import asyncio
+import re
+import time
+from typing import AsyncIterator, List, Optional
+from apps.calculator.arith import evaluate
+from apps.calculator.breaker import model_breaker
+from apps.calculator.cache import get_result, image_digest, put_result, transcriptions, vars_key
+from apps.calculator.limiter import Overloaded, model_limiter
+from apps.calculator.pipeline import prepare
+from apps.calculator.ratelimit import estimate_tokens, quota_limiter
+from apps.calculator.sessions import last_answers, remember_assignments, remember_image, session_vars
+from apps.calculator.tiers import analyze_routed
+from apps.calculator.variables import prune_vars
+from constants import BATCH_CONCURRENCY
+from metrics import inc
+from schema import ImageData
+
+# A plain assignment as drawn: a single name set to a number
+PLAIN_ASSIGNMENT = re.compile(r"\s*([^\W\d]\w*)\s*=\s*([+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)\s*")
+
+# Re-solve a previously transcribed canvas locally with the current variables,
+# from what was drawn ('expr' may hold values the model substituted). Returns
+# None if any answer needs the model: no transcription, an equation or an
+# assignment that is not name = number.
+def reevaluate(answers: list, dict_of_vars: dict) -> Optional[list]:
+    solved = []
+    for answer in answers:
+        answer = dict(answer)
+        drawn = answer.get('drawn')
+        if not isinstance(drawn, str):
+            return None
+        if answer.get('assign'):
+            match = PLAIN_ASSIGNMENT.fullmatch(drawn)
+            if match is None or match.group(1) != str(answer.get('expr', '')).strip():
+                return None
+            answer['result'] = evaluate(match.group(2), {})
+        else:
+            expr = drawn.strip().rstrip('=').strip()
+            try:
+                answer['result'] = evaluate(expr, dict_of_vars)
+            except Exception:
+                return None
+            answer['expr'] = expr
+        solved.append(answer)
+    return solved
+
+# Degraded mode while the breaker is open: local answers or a fast failure
+def solve_locally(digest: str, dict_of_vars: dict) -> list:
+    previous = transcriptions.get(digest)
+    if previous is not None:
+        answers = reevaluate(previous, dict_of_vars)
+        if answers is not None:
+            print("Served locally while the model backend is unavailable")
+            return answers
+    raise Overloaded(model_breaker.retry_after(), "Model backend unavailable")
+
+# Analyses in progress, so shutdown can wait for them to finish
+in_flight = 0
+
+# Wait up to timeout seconds for in-flight analyses; returns how many are left
+async def drain(timeout: float) -> int:
+    deadline = time.monotonic() + timeout
+    while in_flight and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    return in_flight
+
+async def _solve(digest: str, image_data: str, all_vars: dict) -> list:
+    global in_flight
+    in_flight += 1
+    try:
+        return await _analyze(digest, image_data, all_vars)
+    finally:
+        in_flight -= 1
+
+async def _analyze(digest: str, image_data: str, all_vars: dict) -> list:
+    # Send only the variables the last transcription of this canvas used
+    dict_of_vars = prune_vars(all_vars, transcriptions.get(digest))
+    cached = get_result(digest, dict_of_vars)
+    if cached is not None:
+        return cached
+    prepared = await prepare(image_data)
+    if prepared["blank"]:
+        inc("shortcircuit.blank")
+        return []
+    if not model_breaker.allow():
+        return solve_locally(digest, all_vars)
+    inc("vars.pruned", len(all_vars) - len(dict_of_vars))
+    tokens = estimate_tokens(dict_of_vars)
+    await quota_limiter.acquire(tokens)
+    called = False
+    try:
+        async with model_limiter.slot():
+            called = True
+            start = time.monotonic()
+            try:
+                answers = await analyze_routed(prepared, dict_of_vars)
+            except Exception:
+                model_breaker.record(False, time.monotonic() - start)
+                raise
+            model_breaker.record(True, time.monotonic() - start)
+    except (Overloaded, asyncio.CancelledError):
+        if not called:
+            quota_limiter.release(tokens)  # shed or gone while queued for a slot
+        raise
+    if answers:
+        put_result(digest, prune_vars(all_vars, answers), answers)
+    return answers
+
+# Single flight: identical concurrent requests share one analysis task. Each
+# caller waits on it shielded, and a caller that goes away cancels it only
+# if nobody else is still waiting.
+class Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+flights = {}
+
+def _land(key: tuple, flight: Flight):
+    if flights.get(key) is flight:
+        del flights[key]
+
+async def _coalesced(digest: str, image_data: str, all_vars: dict) -> list:
+    key = (digest, vars_key(all_vars))
+    flight = flights.get(key)
+    if flight is None:
+        flight = Flight(asyncio.create_task(_solve(digest, image_data, all_vars)))
+        flights[key] = flight
+        flight.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        flight.task.add_done_callback(lambda task: _land(key, flight))
+    else:
+        inc("solve.coalesced")
+    flight.waiters += 1
+    try:
+        return await asyncio.shield(flight.task)
+    except asyncio.CancelledError:
+        if flight.waiters == 1 and not flight.task.done():
+            # Unlist it first so a new request starts a fresh flight
+            # instead of joining one that is being cancelled
+            _land(key, flight)
+            flight.task.cancel()
+            inc("solve.cancelled")
+        raise
+    finally:
+        flight.waiters -= 1
+
+async def solve(data: ImageData) -> list:
+    digest = image_digest(data.image)
+    if data.session_id:
+        # Same canvas resubmitted: repeat the answer instead of re-solving
+        # with variables that now include its own assignments
+        answers = last_answers(data.session_id, digest, data.dict_of_vars)
+        if answers is not None:
+            inc("shortcircuit.unchanged")
+            return answers
+    dict_of_vars = session_vars(data.session_id, data.dict_of_vars)
+    answers = await _coalesced(digest, data.image, dict_of_vars)
+    if data.session_id:
+        remember_assignments(data.session_id, answers)
+        remember_image(data.session_id, digest, answers)
+    return answers
+
+# Solve one batch item, turning failures into a per-item error
+async def _solve_item(index: int, data: ImageData, semaphore: asyncio.Semaphore) -> dict:
+    async with semaphore:
+        try:
+            return {"index": index, "data": await solve(data), "error": None}
+        except Exception as e:
+            print(f"Batch item {index} failed: {e}")
+            return {"index": index, "data": [], "error": str(e)}
+
+# Yield batch results as they complete, at most BATCH_CONCURRENCY at a time
+async def solve_batch_stream(items: List[ImageData]) -> AsyncIterator[dict]:
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    tasks = [asyncio.create_task(_solve_item(i, item, semaphore)) for i, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # No-op for finished items; stops the rest if the consumer goes away
+        for task in tasks:
+            task.cancel()
+
+# Solve all batch items and return the results in input order
+async def solve_batch(items: List[ImageData]) -> List[dict]:
+    results = [None] * len(items)
+    async for result in solve_batch_stream(items):
+        results[result["index"]] = result
+    return results
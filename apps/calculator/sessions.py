@@ -0,0 +1,74 @@
+import re
+from typing import Optional
+
+from cachetools import TTLCache
+
+from constants import MAX_VAR_NAME, MAX_VAR_VALUE, MAX_VARS, SESSION_MAX, SESSION_TTL
+from metrics import inc
+
+# session id -> variables assigned so far in that session
+sessions = TTLCache(maxsize=SESSION_MAX, ttl=SESSION_TTL)
+# session id -> (image digest, answers) of the last canvas answered
+last_images = TTLCache(maxsize=SESSION_MAX, ttl=SESSION_TTL)
+
+def get_vars(session_id: str) -> Optional[dict]:
+    return sessions.get(session_id)
+
+# Model-assigned names must look like a variable
+NAME = re.compile(r"[^\W\d]\w*")
+
+# Merge into a session's store under the same bounds as a request's
+# dict_of_vars: values past them, and new names past MAX_VARS, are dropped
+def _merge(variables: dict, changes: dict):
+    for name, value in changes.items():
+        valid = (
+            isinstance(name, str) and 0 < len(name) <= MAX_VAR_NAME
+            and not isinstance(value, bool) and isinstance(value, (int, float, str))
+            and not (isinstance(value, str) and len(value) > MAX_VAR_VALUE)
+        )
+        if not valid or (name not in variables and len(variables) >= MAX_VARS):
+            inc("sessions.vars_dropped")
+            continue
+        variables[name] = value
+
+# Variables for this request: the session's store updated with whatever the
+# client sent (new or changed values only)
+def session_vars(session_id: Optional[str], changes: dict) -> dict:
+    if not session_id:
+        return changes
+    variables = sessions.get(session_id, {})
+    _merge(variables, changes)
+    sessions[session_id] = variables  # also refreshes the TTL
+    return dict(variables)
+
+# Merge the answer's assignments (assign: True) into the session store
+def remember_assignments(session_id: str, answers: list):
+    variables = sessions.get(session_id, {})
+    assigned = {}
+    for answer in answers:
+        if answer.get('assign') and 'expr' in answer and 'result' in answer:
+            name = str(answer['expr']).strip()
+            if NAME.fullmatch(name):
+                assigned[name] = answer['result']
+            else:
+                inc("sessions.vars_dropped")
+    _merge(variables, assigned)
+    sessions[session_id] = variables
+
+# Answers for a resubmission of the canvas this session just had answered,
+# unless the client sent variable values the session does not have yet
+def last_answers(session_id: str, digest: str, changes: dict) -> Optional[list]:
+    last = last_images.get(session_id)
+    if last is None or last[0] != digest:
+        return None
+    variables = sessions.get(session_id, {})
+    if any(variables.get(name) != value for name, value in changes.items()):
+        return None
+    return last[1]
+
+def remember_image(session_id: str, digest: str, answers: list):
+    last_images[session_id] = (digest, answers)
+
+def clear(session_id: str) -> bool:
+    last_images.pop(session_id, None)
+    return sessions.pop(session_id, None) is not None
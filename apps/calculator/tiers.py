@@ -0,0 +1,82 @@
+from decimal import Decimal, InvalidOperation
+from io import BytesIO
+
+from PIL import Image
+
+from apps.calculator.arith import evaluate
+from apps.calculator.classifier import choose_prompt
+from apps.calculator.limiter import Overloaded
+from apps.calculator.ratelimit import estimate_tokens, quota_limiter
+from apps.calculator.utils import analyze_image, ink_bbox
+from constants import MODEL_TIERS, SMALL_INK_AREA
+from metrics import inc
+
+# Small drawings (a short expression) start on the cheapest model,
+# everything else on the second tier
+def starting_tier(img: Image) -> int:
+    bbox = ink_bbox(img)
+    if bbox is not None:
+        left, top, right, bottom = bbox
+        if (right - left) * (bottom - top) <= SMALL_INK_AREA:
+            return 0
+    return min(1, len(MODEL_TIERS) - 1)
+
+# A result's value and the absolute tolerance its written precision allows:
+# "0.83" for 5 / 6 is right to half a unit in the last place shown. Results
+# that are themselves expressions ("5/6") are evaluated.
+def result_value(result, dict_of_vars: dict) -> tuple:
+    if isinstance(result, bool):
+        raise TypeError("boolean result")
+    text = str(result).strip()
+    try:
+        exponent = Decimal(text).as_tuple().exponent
+        if not isinstance(exponent, int):
+            raise InvalidOperation()  # nan, infinity
+        return float(text), 0.5 * 10.0 ** min(0, exponent)
+    except InvalidOperation:
+        return evaluate(text, dict_of_vars), 0.0
+
+# An answer is suspect if nothing parsed, a key is missing, or a plain
+# arithmetic expression disagrees with the local evaluator
+def is_suspect(answers: list, dict_of_vars: dict) -> bool:
+    if not answers:
+        return True
+    for answer in answers:
+        if not isinstance(answer, dict) or 'expr' not in answer or 'result' not in answer:
+            return True
+        if answer.get('assign'):
+            continue
+        try:
+            expected = evaluate(str(answer['expr']), dict_of_vars)
+        except Exception:
+            continue  # not plain arithmetic, nothing to check against
+        try:
+            value, tolerance = result_value(answer['result'], dict_of_vars)
+        except Exception:
+            return True
+        if abs(value - expected) > tolerance + 1e-9 * max(1, abs(expected)):
+            return True
+    return False
+
+# prepared is the preprocessed canvas from pipeline.prepare
+async def analyze_routed(prepared: dict, dict_of_vars: dict) -> list:
+    upload = {"mime_type": prepared["mime_type"], "data": prepared["data"]}
+    img = Image.open(BytesIO(prepared["data"]))  # small: cropped, binarised
+    tier = starting_tier(img)
+    version = await choose_prompt(img, upload)
+    inc(f"route.start.{MODEL_TIERS[tier]}")
+    while True:
+        answers = await analyze_image(upload, dict_of_vars, MODEL_TIERS[tier], version)
+        if tier == len(MODEL_TIERS) - 1 or not is_suspect(answers, dict_of_vars):
+            inc(f"route.answered.{MODEL_TIERS[tier]}")
+            return answers
+        try:
+            await quota_limiter.acquire(estimate_tokens(dict_of_vars))
+        except Overloaded:
+            inc("route.escalation_shed")
+            return answers  # no quota to escalate; keep what we have
+        print(f"Escalating from {MODEL_TIERS[tier]} to {MODEL_TIERS[tier + 1]}")
+        inc("route.escalations")
+        inc(f"route.escalate.{MODEL_TIERS[tier]}")
+        tier += 1
+        version = None  # a misclassified canvas is a likely cause; use the full prompt
@@ -1,70 +1,104 @@
-import google.generativeai as genai
-import ast
-import json
-from PIL import Image
-from constants import GEMINI_API_KEY
+from PIL import Image, ImageChops
+from apps.calculator.backend import generate, get_model
+from apps.calculator.parser import parse_answers
+from apps.calculator.prompts import choose_version, variables_prompt
+from apps.calculator.ratelimit import estimate_tokens
+from apps.calculator.variables import canonical_vars
+from constants import BLANK_INK_SHARE, MAX_OUTPUT_TOKENS
+from metrics import inc
 
-genai.configure(api_key=GEMINI_API_KEY)
-
-import ast
 import re
-import json
 
-def analyze_image(img: Image, dict_of_vars: dict):
-    model = genai.GenerativeModel(model_name="gemini-1.5-flash")
-    dict_of_vars_str = json.dumps(dict_of_vars, ensure_ascii=False)
-    
-    # Prepare the prompt
-    prompt = (
-        f"You have been given an image with some mathematical expressions, equations, or graphical problems, and you need to solve them. "
-        f"Note: Use the PEMDAS rule for solving mathematical expressions. PEMDAS stands for the Priority Order: Parentheses, Exponents, Multiplication and Division (from left to right), Addition and Subtraction (from left to right). Parentheses have the highest priority, followed by Exponents, then Multiplication and Division, and lastly Addition and Subtraction. "
-        f"For example: "
-        f"Q. 2 + 3 * 4 "
-        f"(3 * 4) => 12, 2 + 12 = 14. "
-        f"Q. 2 + 3 + 5 * 4 - 8 / 2 "
-        f"5 * 4 => 20, 8 / 2 => 4, 2 + 3 => 5, 5 + 20 => 25, 25 - 4 => 21. "
-        f"YOU CAN HAVE FIVE TYPES OF EQUATIONS/EXPRESSIONS IN THIS IMAGE, AND ONLY ONE CASE SHALL APPLY EVERY TIME: "
-        f"Following are the cases: "
-        f"1. Simple mathematical expressions like 2 + 2, 3 * 4, 5 / 6, 7 - 8, etc.: In this case, solve and return the answer in the format of a LIST OF ONE DICT [{{'expr': given expression, 'result': calculated answer}}]. "
-        f"2. Set of Equations like x^2 + 2x + 1 = 0, 3y + 4x = 0, 5x^2 + 6y + 7 = 12, etc.: In this case, solve for the given variable, and the format should be a COMMA SEPARATED LIST OF DICTS, with dict 1 as {{'expr': 'x', 'result': 2, 'assign': True}} and dict 2 as {{'expr': 'y', 'result': 5, 'assign': True}}. This example assumes x was calculated as 2, and y as 5. Include as many dicts as there are variables. "
-        f"3. Assigning values to variables like x = 4, y = 5, z = 6, etc.: In this case, assign values to variables and return another key in the dict called {{'assign': True}}, keeping the variable as 'expr' and the value as 'result' in the original dictionary. RETURN AS A LIST OF DICTS. "
-        f"4. Analyzing Graphical Math problems, which are word problems represented in drawing form, such as cars colliding, trigonometric problems, problems on the Pythagorean theorem, adding runs from a cricket wagon wheel, etc. These will have a drawing representing some scenario and accompanying information with the image. PAY CLOSE ATTENTION TO DIFFERENT COLORS FOR THESE PROBLEMS. You need to return the answer in the format of a LIST OF ONE DICT [{{'expr': given expression, 'result': calculated answer}}]. "
-        f"5. Detecting Abstract Concepts that a drawing might show, such as love, hate, jealousy, patriotism, or a historic reference to war, invention, discovery, quote, etc. USE THE SAME FORMAT AS OTHERS TO RETURN THE ANSWER, where 'expr' will be the explanation of the drawing, and 'result' will be the abstract concept. "
-        f"Analyze the equation or expression in this image and return the answer according to the given rules: "
-        f"Here is a dictionary of user-assigned variables. If the given expression has any of these variables, use its actual value from this dictionary accordingly: {dict_of_vars_str}. "
-        f"DO NOT USE BACKTICKS OR MARKDOWN FORMATTING. "
-        f"PROPERLY QUOTE THE KEYS AND VALUES IN THE DICTIONARY FOR EASIER PARSING WITH Python's ast.literal_eval."
-    )
-    
-    # Generate content
-    response = model.generate_content([prompt, img])
-    print(f"Raw response: {response.text}")
+# Constrain the model to a JSON list of {expr, result, assign, drawn}. The schema
+# only allows one type per field, so results come back as strings and
+# numeric ones are converted back below.
+ANSWER_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "expr": {"type": "string"},
+            "result": {"type": "string"},
+            "assign": {"type": "boolean"},
+            "drawn": {"type": "string"},  # the canvas as written, for variable pruning
+        },
+        "required": ["expr", "result"],
+    },
+}
+GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": ANSWER_SCHEMA,
+    "max_output_tokens": MAX_OUTPUT_TOKENS,
+}
+NUMBER = re.compile(r"-?\d+(\.\d+)?")
+
+# Bounding box of everything drawn on the canvas, or None for an empty canvas
+def ink_bbox(img: Image):
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        alpha = img.convert("RGBA").getchannel("A")
+        if alpha.getextrema()[0] < 255:
+            return alpha.getbbox()
+    rgb = img.convert("RGB")
+    background = Image.new("RGB", rgb.size, rgb.getpixel((0, 0)))
+    return ImageChops.difference(rgb, background).getbbox()
+
+# Empty canvas: almost no pixels differ from the background, judged from the
+# alpha (or luminance) histogram so antialiasing noise does not count as ink
+def is_blank(img: Image, ink_share: float = BLANK_INK_SHARE) -> bool:
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        alpha = img.convert("RGBA").getchannel("A")
+        if alpha.getextrema()[0] < 255:
+            histogram = alpha.histogram()
+            return sum(histogram[32:]) <= ink_share * alpha.width * alpha.height
+    luminance = img.convert("L")
+    background = luminance.getpixel((0, 0))
+    histogram = luminance.histogram()
+    ink = sum(count for level, count in enumerate(histogram) if abs(level - background) >= 32)
+    return ink <= ink_share * luminance.width * luminance.height
 
-    # Clean and parse the response
-    cleaned_response = re.sub(r"(?<=\w)([A-Z])", r" \1", response.text)  # Add spacing before uppercase words
-    cleaned_response = re.sub(r"(\d)([a-zA-Z])", r"\1 \2", cleaned_response)  # Add spacing after numbers
-    print(f"Cleaned response: {cleaned_response}")
+# img is a PIL image or an already encoded {"mime_type", "data"} blob
+async def analyze_image(img, dict_of_vars: dict, model_name: str = "gemini-1.5-flash", version: str = None):
+    dict_of_vars_str = canonical_vars(dict_of_vars)
+    version = version or choose_version()
+    inc(f"prompt.{version}")
+    model = await get_model(model_name, version, GENERATION_CONFIG)
 
-    answers = []
-    try:
-        answers = ast.literal_eval(cleaned_response)
-    except Exception as e:
-        print(f"Error parsing response: {e}")
-        print(f"Fallback raw response: {cleaned_response}")
+    # Generate content; the instructions travel as the model's system instruction
+    response = await generate(model, [variables_prompt(dict_of_vars_str), img], estimate_tokens(dict_of_vars))
+    print(f"Raw response: {response.text}")
+
+    answers = parse_answers(response.text)
+    if not answers:
+        print(f"Error parsing response: {response.text}")
         return []
 
+    # Drop items the response models could not serialise (missing expr or
+    # result, a result that is not a number or string) instead of failing
+    # the whole request
+    valid = [
+        answer for answer in answers
+        if isinstance(answer, dict)
+        and isinstance(answer.get('expr'), (str, int, float)) and not isinstance(answer['expr'], bool)
+        and isinstance(answer.get('result'), (str, int, float)) and not isinstance(answer['result'], bool)
+    ]
+    if len(valid) < len(answers):
+        print(f"Dropped {len(answers) - len(valid)} malformed answers")
+        inc("answers.malformed", len(answers) - len(valid))
+    answers = valid
+
     # Post-process answers for proper formatting
     for answer in answers:
-        if 'assign' in answer:
-            answer['assign'] = True
-        else:
-            answer['assign'] = False
+        if not isinstance(answer.get('drawn'), str):
+            answer.pop('drawn', None)
+        answer['assign'] = answer.get('assign') in (True, 'true', 'True')
 
         # Ensure proper spacing in 'expr' and 'result'
         if 'expr' in answer and isinstance(answer['expr'], str):
             answer['expr'] = re.sub(r"\s+", " ", answer['expr']).strip()  # Normalize spaces
         if 'result' in answer and isinstance(answer['result'], str):
             answer['result'] = re.sub(r"\s+", " ", answer['result']).strip()  # Normalize spaces
+            if NUMBER.fullmatch(answer['result']):
+                answer['result'] = float(answer['result']) if '.' in answer['result'] else int(answer['result'])
 
     print(f"Final processed answers: {answers}")
     return answers
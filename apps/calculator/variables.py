@@ -0,0 +1,58 @@
+import json
+import re
+from typing import Optional
+
+IDENTIFIER = re.compile(r"[^\W\d]\w*")  # Unicode names too: θ, α, π
+NUMBER = re.compile(r"[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d+)?")
+
+# 2, 2.0 and "2" are the same value; floats are rounded to 12 significant
+# digits so float noise does not change the encoding. Only floats below
+# 2**53 become ints: past that the int would spell out float error
+# (1e23 -> 99999999999999991611392).
+def _normalise(value):
+    if isinstance(value, str):
+        value = value.strip()
+        if not NUMBER.fullmatch(value):
+            return value
+        value = float(value)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    if isinstance(value, float):
+        if value != value or value in (float("inf"), float("-inf")):
+            return str(value)
+        value = float(f"{value:.12g}")
+        if value.is_integer() and abs(value) < 2**53:
+            return int(value)
+    return value
+
+# Order-independent, type-normalised encoding of the variables, used in the
+# prompt and in every cache key so equivalent requests look identical
+def canonical_vars(dict_of_vars: dict) -> str:
+    normalised = {str(name).strip(): _normalise(value) for name, value in dict_of_vars.items()}
+    return json.dumps(normalised, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+# Names written on the canvas, from each answer's 'drawn' transcription, or
+# None if any answer lacks one. 'expr' is no substitute: for equations and
+# assignments it holds only the solved variable, and the model may have
+# substituted values into it.
+def referenced_names(answers: list) -> Optional[set]:
+    names = set()
+    for answer in answers:
+        drawn = answer.get('drawn') if isinstance(answer, dict) else None
+        if not isinstance(drawn, str) or not drawn.strip():
+            return None
+        for name in IDENTIFIER.findall(drawn):
+            # "xy" may be x times y: keeping extra names is only a longer prompt
+            names.add(name)
+            names.update(name)
+    return names
+
+# Only the variables a transcription of this canvas actually uses; without a
+# complete transcription there is nothing to go on and every variable is kept
+def prune_vars(dict_of_vars: dict, answers: Optional[list]) -> dict:
+    if answers is None or not dict_of_vars:
+        return dict_of_vars
+    names = referenced_names(answers)
+    if names is None:
+        return dict_of_vars
+    return {name: value for name, value in dict_of_vars.items() if name in names}
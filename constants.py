@@ -6,4 +6,112 @@ SERVER_URL = 'localhost'
 PORT = os.getenv("PORT", 8000)
 ENV = 'dev'
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
\ No newline at end of file
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+# Background job queue
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 100))
+JOB_TTL = int(os.getenv("JOB_TTL", 3600))  # seconds a finished job stays pollable
+# Hosts job callbacks may be sent to (comma separated); empty allows any public host
+CALLBACK_HOSTS = [host.strip().lower() for host in os.getenv("CALLBACK_HOSTS", "").split(",") if host.strip()]
+
+# Batch analysis
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 500))
+
+# Adaptive concurrency limit around the model call
+LIMIT_INITIAL = int(os.getenv("LIMIT_INITIAL", 8))
+LIMIT_MIN = int(os.getenv("LIMIT_MIN", 1))
+LIMIT_MAX = int(os.getenv("LIMIT_MAX", 64))
+LIMIT_LATENCY_TARGET = float(os.getenv("LIMIT_LATENCY_TARGET", 10))  # seconds
+LIMIT_QUEUE_SIZE = int(os.getenv("LIMIT_QUEUE_SIZE", 100))
+LIMIT_QUEUE_TIMEOUT = float(os.getenv("LIMIT_QUEUE_TIMEOUT", 5))  # seconds
+
+# Client-side view of the Gemini quota (0 disables a bucket)
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", 2000))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", 4000000))
+RATE_TOKENS_PER_REQUEST = int(os.getenv("RATE_TOKENS_PER_REQUEST", 1200))
+RATE_MAX_WAIT = float(os.getenv("RATE_MAX_WAIT", 2))  # seconds to wait for capacity
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 1))  # worker processes (set by gunicorn.conf.py)
+
+# Model call deadlines, retries and hedging
+MODEL_TIMEOUT = float(os.getenv("MODEL_TIMEOUT", 30))  # seconds per attempt
+MODEL_RETRIES = int(os.getenv("MODEL_RETRIES", 2))
+MODEL_RETRY_BACKOFF = float(os.getenv("MODEL_RETRY_BACKOFF", 0.5))  # seconds, doubled per retry
+MODEL_HEDGE = os.getenv("MODEL_HEDGE", "false").lower() == "true"
+MODEL_HEDGE_MIN_DELAY = float(os.getenv("MODEL_HEDGE_MIN_DELAY", 1))  # seconds
+
+# Answer cache
+CACHE_SIZE = int(os.getenv("CACHE_SIZE", 10000))
+CACHE_TTL = int(os.getenv("CACHE_TTL", 3600))  # seconds
+
+# Circuit breaker around the model backend
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", 20))  # recent calls considered
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", 10))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", 0.5))
+BREAKER_SLOW_CALL = float(os.getenv("BREAKER_SLOW_CALL", 20))  # seconds
+BREAKER_SLOW_RATE = float(os.getenv("BREAKER_SLOW_RATE", 0.8))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", 30))  # seconds before a probe
+
+# Model tiers, cheapest first; requests escalate on unparseable or suspect answers
+MODEL_TIERS = os.getenv("MODEL_TIERS", "gemini-1.5-flash-8b,gemini-1.5-flash,gemini-1.5-pro").split(",")
+SMALL_INK_AREA = int(os.getenv("SMALL_INK_AREA", 250000))  # px; smaller drawings start on the cheapest tier
+
+# Upper bound on generated answer length
+MAX_OUTPUT_TOKENS = int(os.getenv("MAX_OUTPUT_TOKENS", 1024))
+
+# Prompt version, plus an optional A/B share for a second version
+PROMPT_VERSION = os.getenv("PROMPT_VERSION", "v1")
+PROMPT_AB_VERSION = os.getenv("PROMPT_AB_VERSION")
+PROMPT_AB_SHARE = float(os.getenv("PROMPT_AB_SHARE", 0))
+
+# Provider-side context caching of the static instructions
+CONTEXT_CACHE = os.getenv("CONTEXT_CACHE", "false").lower() == "true"
+CONTEXT_CACHE_TTL = int(os.getenv("CONTEXT_CACHE_TTL", 3600))  # seconds
+
+# Pre-classification for case-specific prompts: "local" heuristics, "model" or "off"
+CLASSIFIER = os.getenv("CLASSIFIER", "off")
+CLASSIFIER_MODEL = os.getenv("CLASSIFIER_MODEL", "gemini-1.5-flash-8b")
+
+# Server-side variable store per session
+SESSION_MAX = int(os.getenv("SESSION_MAX", 10000))
+SESSION_TTL = int(os.getenv("SESSION_TTL", 86400))  # seconds since last use
+
+# Canvases with less ink than this share of their pixels count as blank
+BLANK_INK_SHARE = float(os.getenv("BLANK_INK_SHARE", 0.0002))
+
+# Canvas preprocessing before upload: "binarise" or "off"
+PREPROCESS = os.getenv("PREPROCESS", "binarise")
+INK_PALETTE_COLOURS = int(os.getenv("INK_PALETTE_COLOURS", 8))
+
+# Upload encoding: CPU budget per canvas (seconds)
+ENCODE_BUDGET = float(os.getenv("ENCODE_BUDGET", 0.05))
+
+# Preprocessing process pool for large canvases (0 workers keeps it in-process)
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", os.cpu_count() or 1))
+POOL_MIN_BYTES = int(os.getenv("POOL_MIN_BYTES", 262144))  # base64 payload size
+CROP_MARGIN = int(os.getenv("CROP_MARGIN", 16))  # px kept around the ink
+MAX_SIDE = int(os.getenv("MAX_SIDE", 1600))  # px; larger canvases are scaled down
+
+# Import the Gemini SDK at app import (for pre-forking servers) instead of after startup
+PRELOAD = os.getenv("PRELOAD", "false").lower() == "true"
+
+# Startup warm-up: optional test model call and an answer cache file to load
+WARMUP_CALL = os.getenv("WARMUP_CALL", "false").lower() == "true"
+CACHE_FILE = os.getenv("CACHE_FILE")
+
+# Graceful shutdown: seconds to keep serving with /ready false after SIGTERM,
+# then seconds to wait for in-flight analyses
+SHUTDOWN_DELAY = float(os.getenv("SHUTDOWN_DELAY", 5))
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", 25))
+
+# Directory for per-worker metric files (set by gunicorn.conf.py); empty keeps metrics process-local
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+
+# Request validation: bounds on dict_of_vars
+MAX_VARS = int(os.getenv("MAX_VARS", 100))
+MAX_VAR_NAME = int(os.getenv("MAX_VAR_NAME", 64))
+MAX_VAR_VALUE = int(os.getenv("MAX_VAR_VALUE", 256))
+
+# Seconds between client-disconnect checks on /calculate
+DISCONNECT_POLL = float(os.getenv("DISCONNECT_POLL", 0.25))
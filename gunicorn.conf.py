@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+
+# Production launcher: gunicorn --config gunicorn.conf.py main:app
+# uvicorn workers with the app preloaded in the master so they share its
+# pages copy-on-write, uvloop/httptools when installed.
+#
+# WORKERS sets the number of workers: 1 by default (or WEB_CONCURRENCY),
+# "auto" for one per available CPU. Each worker keeps its own in-memory
+# state: the job queue, session variables, last-canvas short-circuit, answer
+# cache and circuit breaker. A request served by another worker does not see it, so
+# /calculate/jobs and session_id need a single worker. Use more workers
+# only for stateless /calculate and /calculate/batch traffic.
+
+# CPUs this container may actually use (affinity and cgroup quota)
+def available_cpus() -> int:
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+concurrency = os.getenv("WORKERS") or os.getenv("WEB_CONCURRENCY", "1")
+workers = available_cpus() if concurrency == "auto" else int(concurrency)
+worker_class = "uvicorn.workers.UvicornWorker"  # loop/http "auto" picks uvloop/httptools
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+preload_app = True
+# SIGTERM delay (readiness off, still serving) plus the drain, plus margin
+graceful_timeout = int(float(os.getenv("SHUTDOWN_DELAY", 5)) + float(os.getenv("DRAIN_TIMEOUT", 25))) + 5
+keepalive = 5
+
+# Read by constants.py when the app is preloaded below: split the provider
+# quota between workers, and with several workers keep preprocessing in each
+# worker's threads instead of a process pool per worker
+os.environ["WEB_CONCURRENCY"] = str(workers)
+if workers > 1:
+    os.environ.setdefault("PREPROCESS_WORKERS", "0")
+
+# Per-worker counter files on tmpfs, summed by /metrics
+shm = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+os.environ.setdefault("METRICS_DIR", os.path.join(shm, f"mathnotes-metrics-{os.getpid()}"))
+
+def on_starting(server):
+    shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["METRICS_DIR"])
+
+def on_exit(server):
+    shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
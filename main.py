@@ -1,9 +1,36 @@
+import time
+_import_start = time.perf_counter()
+
+import asyncio
+import signal
+import sys
+import threading
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse
 import uvicorn
 from dotenv import load_dotenv
 import os
+from apps.calculator import cache
+from apps.calculator.backend import generate, get_model, preload
+from apps.calculator.jobs import job_queue
+from apps.calculator.limiter import Overloaded
+from apps.calculator.pipeline import shutdown_pool
+from apps.calculator.ratelimit import quota_limiter
+from apps.calculator.service import drain
+from apps.calculator.utils import GENERATION_CONFIG
+from constants import (
+    CACHE_FILE,
+    DRAIN_TIMEOUT,
+    MODEL_TIERS,
+    PRELOAD,
+    PROMPT_VERSION,
+    SHUTDOWN_DELAY,
+    WARMUP_CALL,
+    WEB_CONCURRENCY,
+)
+from metrics import flush, publish, snapshot
 
 # Load environment variables from .env file (for local development)
 load_dotenv()
@@ -13,13 +40,86 @@ ENV = os.getenv("ENV", "dev")  # Default to "dev" if not set
 PORT = os.getenv("PORT", 8000)  # Default to 8000 if not set
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")  # Local frontend default
 
+WARMUP_TOKENS = 50
+
+# Warm-up runs after the server is up, so "/" and /live answer immediately;
+# /ready stays false until it has finished
+async def warm_up(app: FastAPI):
+    while True:
+        try:
+            seconds = await asyncio.to_thread(preload)
+            print(f"Gemini SDK ready after {seconds * 1000:.0f} ms")
+            model = await get_model(MODEL_TIERS[0], PROMPT_VERSION, GENERATION_CONFIG)
+            if WARMUP_CALL:
+                await quota_limiter.acquire(WARMUP_TOKENS)
+                await generate(model, ["Warm-up request: reply with an empty list."], WARMUP_TOKENS)
+            if CACHE_FILE:
+                data = await asyncio.to_thread(cache.read_file, CACHE_FILE)
+                if data:
+                    print(f"Loaded {cache.restore(data)} cached answers")
+            app.state.ready = not app.state.stopping
+            print("Ready to serve")
+            return
+        except Exception as e:
+            print(f"Warm-up failed, retrying: {e}")
+            await asyncio.sleep(5)
+
+# On SIGTERM, report not ready straight away but keep serving for
+# SHUTDOWN_DELAY seconds so load balancers stop routing here, then hand the
+# signal to the server (uvicorn's handler), which closes the listener and
+# drains. A second SIGTERM is passed on at once.
+def defer_sigterm(app: FastAPI):
+    if threading.current_thread() is not threading.main_thread():
+        return  # signals can only be handled on the main thread
+    server_handler = signal.getsignal(signal.SIGTERM)
+    if not callable(server_handler):
+        return
+    loop = asyncio.get_running_loop()
+
+    def handler(signum, frame):
+        if app.state.stopping:
+            server_handler(signum, frame)
+            return
+        app.state.stopping = True
+        app.state.ready = False
+        print(f"SIGTERM: not ready, stopping in {SHUTDOWN_DELAY:.0f}s")
+        loop.call_soon_threadsafe(loop.call_later, SHUTDOWN_DELAY, server_handler, signum, frame)
+
+    signal.signal(signal.SIGTERM, handler)
+
 # Async context manager for FastAPI lifespan
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    app.state.ready = False
+    app.state.stopping = False
+    defer_sigterm(app)
+    await job_queue.start()
+    warm_up_task = asyncio.create_task(warm_up(app))
+    publish_task = asyncio.create_task(publish())
     yield
+    # Shutdown (readiness went false at SIGTERM): stop taking work, let
+    # in-flight model calls finish (bounded) so clients do not retry them
+    # against the next deploy, then flush
+    app.state.ready = False
+    warm_up_task.cancel()
+    publish_task.cancel()
+    job_queue.close()
+    left = await drain(DRAIN_TIMEOUT)
+    if left:
+        print(f"Drain timed out with {left} analyses in flight")
+    await job_queue.stop()
+    shutdown_pool()
+    if CACHE_FILE:
+        try:
+            await asyncio.to_thread(cache.write_file, CACHE_FILE, cache.dump())
+            print(f"Saved {len(cache.results)} cached answers")
+        except Exception as e:
+            print(f"Saving the answer cache failed: {e}")
+    flush()
+    sys.stdout.flush()
 
-# Initialize FastAPI app
-app = FastAPI(lifespan=lifespan)
+# Initialize FastAPI app; responses are serialised with orjson
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # CORS Middleware Configuration
 app.add_middleware(
@@ -33,21 +133,56 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Shed load with a fast 503 instead of queueing without bound
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"message": str(exc), "status": "error"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 # Root route to verify server status
 @app.get("/")
 async def root():
     return {"message": "Server is running"}
 
+# Liveness: the process is up and the event loop responds
+@app.get("/live")
+async def live():
+    return {"status": "alive"}
+
+# Readiness: warm-up has finished and traffic can be routed here
+@app.get("/ready")
+async def ready():
+    if not app.state.ready:
+        return JSONResponse(status_code=503, content={"ready": False})
+    return {"ready": True}
+
+@app.get("/metrics")
+async def metrics():
+    return snapshot()
+
 # Include routes from calculator module
 from apps.calculator.route import router as calculator_router
 app.include_router(calculator_router, prefix="/calculate", tags=["calculate"])
 
-# Run the application
+# Import-time report; with PRELOAD the SDK is imported here too, before a
+# pre-forking server (gunicorn --preload) copies the process into workers
+print(f"App imported in {(time.perf_counter() - _import_start) * 1000:.0f} ms")
+if WEB_CONCURRENCY > 1:
+    print(f"{WEB_CONCURRENCY} workers: jobs, sessions and caches are per worker; "
+          "/calculate/jobs and session_id need a single worker")
+if PRELOAD:
+    print(f"Gemini SDK preloaded in {preload() * 1000:.0f} ms")
+
+# Run the application (development; production uses gunicorn.conf.py)
 if __name__ == "__main__":
     # Ensure SERVER_URL is properly set for production
     uvicorn.run(
         "main:app",
         host="0.0.0.0",  # Use 0.0.0.0 for external access
         port=int(PORT),  # Use PORT from environment
-        reload=(ENV == "dev")  # Enable reload only in development mode
+        reload=(ENV == "dev"),  # Enable reload only in development mode
+        timeout_graceful_shutdown=int(DRAIN_TIMEOUT),  # Bound the wait for open requests
     )
@@ -0,0 +1,50 @@
+import asyncio
+import json
+import os
+from collections import Counter
+
+from constants import METRICS_DIR
+
+# Process-local counters, exposed at /metrics. With METRICS_DIR set (the
+# gunicorn launcher), each worker also publishes its counters there about
+# once a second and /metrics sums every worker's file.
+counters = Counter()
+FLUSH_INTERVAL = 1.0
+_dirty = False
+
+def flush():
+    global _dirty
+    _dirty = False
+    if not METRICS_DIR:
+        return
+    path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(counters, f)
+    os.replace(f"{path}.tmp", path)
+
+def inc(name: str, value: int = 1):
+    global _dirty
+    counters[name] += value
+    _dirty = True
+
+# Background task (started in the lifespan) publishing changed counters
+async def publish():
+    while METRICS_DIR:
+        await asyncio.sleep(FLUSH_INTERVAL)
+        if _dirty:
+            flush()
+
+# Totals for the whole process group; files of exited workers still count
+def snapshot() -> dict:
+    if not METRICS_DIR:
+        return dict(sorted(counters.items()))
+    flush()
+    total = Counter()
+    for name in os.listdir(METRICS_DIR):
+        if name.endswith(".json"):
+            try:
+                with open(os.path.join(METRICS_DIR, name)) as f:
+                    total.update(json.load(f))
+            except (OSError, ValueError):
+                pass  # being replaced by its worker
+    return dict(sorted(total.items()))
@@ -1,5 +1,50 @@
-from pydantic import BaseModel
+from typing import Dict, List, Optional, Union
+from pydantic import BaseModel, ConfigDict, Field, StrictFloat, StrictInt, StringConstraints, field_validator
+from typing_extensions import Annotated
+from apps.calculator.callbacks import check_url
+from constants import BATCH_MAX_ITEMS, MAX_VAR_NAME, MAX_VAR_VALUE, MAX_VARS
+
+# Variables are numbers or short expressions, bounded in count and size
+VarName = Annotated[str, StringConstraints(min_length=1, max_length=MAX_VAR_NAME)]
+VarValue = Union[StrictInt, StrictFloat, Annotated[str, StringConstraints(max_length=MAX_VAR_VALUE)]]
+Variables = Annotated[Dict[VarName, VarValue], Field(max_length=MAX_VARS)]
 
 class ImageData(BaseModel):
     image: str
-    dict_of_vars: dict
\ No newline at end of file
+    dict_of_vars: Variables = {}
+    session_id: Optional[str] = None  # variables are kept server-side for the session
+
+class JobRequest(ImageData):
+    priority: int = 0  # higher runs sooner
+    callback_url: Optional[str] = None
+
+    @field_validator("callback_url")
+    @classmethod
+    def safe_callback(cls, url: Optional[str]) -> Optional[str]:
+        return url if url is None else check_url(url)
+
+class BatchImageData(BaseModel):
+    items: Annotated[List[ImageData], Field(max_length=BATCH_MAX_ITEMS)]
+    stream: bool = False  # emit NDJSON lines as items complete
+
+class Answer(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)
+
+    expr: str
+    result: Union[StrictInt, StrictFloat, str]
+    assign: bool = False
+
+class CalculateResponse(BaseModel):
+    message: str
+    data: List[Answer]
+    status: str
+
+class BatchItem(BaseModel):
+    index: int
+    data: List[Answer]
+    error: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    message: str
+    data: List[BatchItem]
+    status: str
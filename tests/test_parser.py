@@ -0,0 +1,39 @@
+from apps.calculator.parser import AnswerParser, parse_answers
+
+def test_well_formed_json_list():
+    text = '[{"expr": "2 + 2", "result": "4", "assign": false}]'
+    assert parse_answers(text) == [{"expr": "2 + 2", "result": "4", "assign": False}]
+
+def test_python_literals_in_fences():
+    text = "```python\n[{'expr': 'x', 'result': 2, 'assign': True}]\n```"
+    assert parse_answers(text) == [{"expr": "x", "result": 2, "assign": True}]
+
+def test_braces_inside_strings():
+    text = "[{'expr': '\\\\frac{1}{2}', 'result': 0.5}]"
+    assert parse_answers(text) == [{"expr": "\\frac{1}{2}", "result": 0.5}]
+
+def test_broken_entry_keeps_neighbours():
+    text = '[{"expr": "1+1", "result": 2}, {"expr": "oops", "result": }, {"expr": "2+2", "result": 4}]'
+    assert parse_answers(text) == [{"expr": "1+1", "result": 2}, {"expr": "2+2", "result": 4}]
+
+def test_unbalanced_quote_resyncs():
+    text = "{'expr': 'it's', 'result': 1} {'expr': '2+2', 'result': 4} {'expr': '3+3', 'result': 6}"
+    assert parse_answers(text) == [{"expr": "2+2", "result": 4}, {"expr": "3+3", "result": 6}]
+
+def test_truncated_output_keeps_complete_entries():
+    text = '[{"expr": "1+1", "result": 2}, {"expr": "2+'
+    assert parse_answers(text) == [{"expr": "1+1", "result": 2}]
+
+def test_streaming_chunks_and_error_count():
+    parser = AnswerParser()
+    answers = []
+    for chunk in ["{'expr': 'it's', 're", "sult': 1} {'expr': '2+2', ", "'result': 4}"]:
+        answers.extend(parser.feed(chunk))
+    answers.extend(parser.close())
+    assert answers == [{"expr": "2+2", "result": 4}]
+    assert parser.errors == 1
+
+def test_deeply_nested_input_does_not_raise():
+    assert parse_answers("[" * 5000 + "]" * 5000) == []
+    assert parse_answers("{" * 5000 + "}" * 5000) == []
+    assert parse_answers("[" + '{"a":' * 3000 + "1" + "}" * 3000 + "]") == []
@@ -0,0 +1,19 @@
+from apps.calculator.variables import canonical_vars, prune_vars, referenced_names
+
+def test_unicode_names_are_referenced():
+    answers = [{"expr": "sin(θ) + α", "result": 1, "drawn": "sin(θ) + α"}]
+    assert {"θ", "α"} <= referenced_names(answers)
+    assert prune_vars({"θ": 30, "α": 2, "β": 5}, answers) == {"θ": 30, "α": 2}
+
+def test_prune_keeps_single_letters_of_products():
+    answers = [{"expr": "xy", "result": 6, "drawn": "xy ="}]
+    assert prune_vars({"x": 2, "y": 3, "z": 4}, answers) == {"x": 2, "y": 3}
+
+def test_prune_keeps_everything_without_transcription():
+    assert prune_vars({"x": 2}, [{"expr": "x", "result": 2}]) == {"x": 2}
+
+def test_canonical_vars_equates_int_float_and_string():
+    assert canonical_vars({"x": 2}) == canonical_vars({"x": 2.0}) == canonical_vars({"x": " 2 "})
+
+def test_canonical_vars_keeps_huge_floats_as_floats():
+    assert canonical_vars({"x": 1e23}) == canonical_vars({"x": "1e23"}) == '{"x":1e+23}'